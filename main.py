@@ -1,25 +1,56 @@
+import asyncio
 import base64
+import functools
+import hashlib
 import io
+import json
+import math
+import multiprocessing
 import os
+import queue
 import random
+import re
+import shutil
+import struct
+import sys
+import threading
 import time
-from dataclasses import dataclass
-from typing import List, Optional, Tuple
-
-from PIL import Image, ImageDraw, ImageFont
+import zlib
+from collections import Counter, OrderedDict, deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
 
+# peak memory reporting is unix only
+try:
+    import resource
+except ImportError:
+    resource = None
+
 # openai images
 try:
-    from openai import OpenAI
+    from openai import (
+        APIConnectionError,
+        APIError,
+        APIStatusError,
+        AsyncOpenAI,
+        OpenAI,
+        RateLimitError,
+    )
 except Exception:
     raise SystemExit("Install the sdk first: pip install openai")
 
 openai_api_key = os.getenv("OPENAI_API_KEY")
 if openai_api_key:
-    client = OpenAI(api_key=openai_api_key)
+    # retries are handled here so the rate limiter sees every 429
+    client = OpenAI(api_key=openai_api_key, max_retries=0)
 
 openai_model = os.getenv("OPENAI_IMAGE_MODEL", "gpt-image-1")
 openai_size = os.getenv("OPENAI_IMAGE_SIZE", "1024x1536")
@@ -31,6 +62,8 @@ CARD_W, CARD_H = 825, 1275
 RADIUS = 64
 MARGIN = 28
 ELLIPSE_MARGIN = 8
+BORDER = 8
+SYMBOL_SIZE = 120
 WHITE = (255, 255, 255)
 COLOR_RED = (228, 39, 43)
 COLOR_YEL = (253, 187, 48)
@@ -68,12 +101,110 @@ generate_first_only = os.getenv("UNO_GENERATE_FIRST_ONLY", "false").lower() == "
 # rendering quality
 upscale_factor = int(os.getenv("UNO_UPSCALE_FACTOR", "3"))
 
+# draw at the upscaled resolution instead of resizing the finished card
+native_render = os.getenv("UNO_NATIVE_RENDER", "true").lower() == "true"
+
+# resample the art once from the source to the final size (native render only)
+single_resample_art = os.getenv("UNO_SINGLE_RESAMPLE_ART", "true").lower() == "true"
+
 # ellipse rotation
 ellipse_rotation = float(os.getenv("UNO_ELLIPSE_ROTATION", "30"))
 
 # border color
 border_color = os.getenv("UNO_BORDER_COLOR", "#000000")
 
+# persist the ellipse masks between runs (empty keeps them in memory only)
+mask_cache_dir = os.getenv("UNO_MASK_CACHE_DIR", "")
+
+# memory for resized art and card base templates, per cache and per process
+# (0 rebuilds them for every card), images larger than the budget are not kept;
+# unset sizes them for the five card bases and four art crops at render scale
+fitted_art_cache_mb = os.getenv("UNO_FITTED_ART_CACHE_MB", "")
+card_base_cache_mb = os.getenv("UNO_CARD_BASE_CACHE_MB", "")
+
+# concurrent art generation (1 keeps the serial behavior)
+art_workers = max(1, int(os.getenv("UNO_ART_WORKERS", "1")))
+
+# asyncio pipeline (uses the async openai client)
+use_async = os.getenv("UNO_ASYNC", "false").lower() == "true"
+
+# art cache keyed by model, size, prompt and variant (empty disables it)
+art_cache_dir = os.getenv("UNO_ART_CACHE_DIR", os.path.join(OUTPUT_DIR, "art-cache"))
+
+# initial request rate, adapted from rate limit headers and 429 responses
+rate_limit_rpm = float(os.getenv("UNO_RATE_LIMIT_RPM", "100"))
+
+# retries with capped exponential backoff and jitter
+image_retries = max(0, int(os.getenv("UNO_RETRIES", "5")))
+retry_base_delay = float(os.getenv("UNO_RETRY_BASE_DELAY", "1"))
+retry_max_delay = float(os.getenv("UNO_RETRY_MAX_DELAY", "30"))
+
+# consecutive failed cards before giving up on the api (0 disables it)
+circuit_breaker_threshold = int(os.getenv("UNO_CIRCUIT_BREAKER_THRESHOLD", "5"))
+
+# seconds an open circuit waits before letting one probe request through
+circuit_breaker_cooldown = float(os.getenv("UNO_CIRCUIT_BREAKER_COOLDOWN", "60"))
+
+# bounded queues between the fetch, render and write stages (0 runs them in sequence)
+pipeline_queue_size = max(0, int(os.getenv("UNO_PIPELINE_QUEUE_SIZE", "2")))
+
+# worker processes for rendering and png encoding (0 renders in this process)
+render_processes = max(0, int(os.getenv("UNO_RENDER_PROCESSES", "0")))
+
+# render and encode in horizontal strips of this many pixels (0 renders whole cards)
+strip_height = max(0, int(os.getenv("UNO_STRIP_HEIGHT", "0")))
+
+# png zlib level, 0 is fastest and largest, 9 smallest and slowest
+png_compress_level = min(9, max(0, int(os.getenv("UNO_PNG_COMPRESS_LEVEL", "6"))))
+
+# keep the transparent card corners (false flattens the cards onto white)
+png_alpha = os.getenv("UNO_PNG_ALPHA", "true").lower() == "true"
+
+# card file format, png or jpeg (jpeg cards are flattened onto white)
+card_format = os.getenv("UNO_CARD_FORMAT", "png").strip().lower()
+card_format = "jpeg" if card_format == "jpg" else card_format
+if card_format not in ("png", "jpeg"):
+    raise SystemExit(f"UNO_CARD_FORMAT must be png or jpeg, got {card_format!r}")
+jpeg_quality = int(os.getenv("UNO_JPEG_QUALITY", "95"))
+
+# background threads encoding card pngs in the pipeline (0 encodes in the write stage)
+png_writers = max(0, int(os.getenv("UNO_PNG_WRITERS", "2")))
+
+# reuse the first render of identical cards, written as copies or hardlinks
+dedupe_renders = os.getenv("UNO_DEDUPE_RENDERS", "true").lower() == "true"
+duplicate_mode = os.getenv("UNO_DUPLICATE_MODE", "copy").lower()
+
+# write the card pngs (false renders the cards straight into the pdf)
+write_pngs = os.getenv("UNO_WRITE_PNGS", "true").lower() == "true"
+
+# print png size and encode time per compression setting instead of building
+png_benchmark = os.getenv("UNO_PNG_BENCHMARK", "false").lower() == "true"
+
+# resample the cards to this print resolution in the pdf (0 embeds them at full size)
+pdf_dpi = max(0, int(os.getenv("UNO_PDF_DPI", "0")))
+
+# write the pdf page by page instead of keeping it in memory until the end
+pdf_streaming = os.getenv("UNO_PDF_STREAMING", "false").lower() == "true"
+
+# copy rgb png and jpeg card data into the streaming pdf without recompressing
+pdf_passthrough = os.getenv("UNO_PDF_PASSTHROUGH", "true").lower() == "true"
+
+# worker processes compressing the card images of the pdf (0 builds it in this process)
+pdf_processes = max(0, int(os.getenv("UNO_PDF_PROCESSES", "0")))
+
+# skip cards already finished by a previous run with the same config
+resume = os.getenv("UNO_RESUME", "true").lower() == "true"
+
+# regenerate only these cards, comma separated file names
+only_cards = {
+    os.path.splitext(name.strip())[0]
+    for name in os.getenv("UNO_ONLY_CARDS", "").split(",")
+    if name.strip()
+}
+
+# distinct art variants per identical prompt (1 shares the art between copies)
+art_variants = max(1, int(os.getenv("UNO_ART_VARIANTS", "1")))
+
 
 # deck specification
 @dataclass
@@ -194,7 +325,10 @@ COLOR_THEME = {
 
 def concept_for_card(card: Card) -> str:
     if card.color == "wild":
-        return random.choice(COLOR_THEME["wild"][1])
+        # fixed per card so the prompt, and its cached art, is the same every run
+        wild_items = COLOR_THEME["wild"][1]
+        index = 2 * (card.copy_index - 1) + (card.kind == "wild_draw4")
+        return wild_items[index % len(wild_items)]
 
     theme_items = COLOR_THEME[card.color][1]
 
@@ -221,15 +355,329 @@ def prompt_for_card(card: Card) -> str:
     return f"{concept_for_card(card)}, {base_style}, {color_hint}"
 
 
+# rate limiting
+def parse_reset_duration(value: str) -> float:
+    # openai reports resets like "1s", "6m0s" or "20ms"
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(
+        float(amount) * units[unit]
+        for amount, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    )
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+
+    return None
+
+
+def header_float(headers, *names: str) -> Optional[float]:
+    for name in names:
+        try:
+            return float(headers[name])
+        except (KeyError, TypeError, ValueError):
+            continue
+
+    return None
+
+
+class RateLimiter:
+    """adaptive token bucket shared by every image request"""
+
+    def __init__(self, rpm: float, burst: int):
+        self.rate = max(rpm, 1) / 60
+        self.max_rate = self.rate
+        self.min_rate = 1 / 60
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """take a token and return how long the caller must wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self):
+        time.sleep(self.reserve())
+
+    async def acquire_async(self):
+        await asyncio.sleep(self.reserve())
+
+    def on_success(self, headers):
+        with self.lock:
+            # the account limit is the ceiling, the rate creeps up towards it
+            limit = header_float(
+                headers, "x-ratelimit-limit-images", "x-ratelimit-limit-requests"
+            )
+            if limit:
+                self.max_rate = limit / 60
+
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+            # quota exhausted for this window, hold everyone until it resets
+            remaining = header_float(
+                headers,
+                "x-ratelimit-remaining-images",
+                "x-ratelimit-remaining-requests",
+            )
+            reset = headers.get("x-ratelimit-reset-images") or headers.get(
+                "x-ratelimit-reset-requests"
+            )
+            if remaining is not None and remaining < 1 and reset:
+                self.blocked_until = max(
+                    self.blocked_until, time.monotonic() + parse_reset_duration(reset)
+                )
+
+    def on_rate_limited(self, headers):
+        with self.lock:
+            # multiplicative decrease and drain the bucket
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+            retry_after = parse_retry_after(headers)
+            if retry_after is None:
+                retry_after = 1 / self.rate
+
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+rate_limiter = RateLimiter(rate_limit_rpm, art_workers)
+
+
 # openai image generation
+def decode_image_bytes(image_bytes: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(image_bytes)).convert("RGBA")
+
+
+# retries and circuit breaker
+class CircuitOpenError(Exception):
+    pass
+
+
+class CardGenerationError(Exception):
+    def __init__(self, failed: List[Tuple[Card, Exception]]):
+        super().__init__(f"{len(failed)} card(s) failed")
+        self.failed = failed
+
+
+class CircuitBreaker:
+    """stops calling the api after too many consecutive failures"""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.next_probe = 0.0
+        self.runs = 0
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.threshold > 0 and self.failures >= self.threshold
+
+    def check(self):
+        with self.lock:
+            if not self.is_open:
+                return
+
+            # half open: one request per cooldown probes whether the api is back
+            now = time.monotonic()
+            if now >= self.next_probe:
+                self.next_probe = now + self.cooldown
+                return
+
+            raise CircuitOpenError(
+                f"circuit open after {self.failures} consecutive failures, "
+                f"next probe in {self.next_probe - now:.0f}s"
+            )
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+
+            # opening, or a failed probe, waits a full cooldown
+            if self.is_open:
+                self.next_probe = time.monotonic() + self.cooldown
+
+    def begin_run(self):
+        # an outage in an earlier run does not fail this one upfront, but a
+        # deck running alongside keeps the state it has seen
+        with self.lock:
+            if self.runs == 0:
+                self.failures = 0
+                self.next_probe = 0.0
+
+            self.runs += 1
+
+    def end_run(self):
+        with self.lock:
+            self.runs -= 1
+
+
+circuit_breaker = CircuitBreaker(circuit_breaker_threshold, circuit_breaker_cooldown)
+
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, (APIConnectionError, RateLimitError)):
+        return True
+
+    return isinstance(e, APIStatusError) and (
+        e.status_code >= 500 or e.status_code in (408, 409)
+    )
+
+
+def on_request_error(e: Exception, attempt: int) -> float:
+    """update limiter and breaker after a failed request, returns the backoff delay"""
+    if isinstance(e, RateLimitError):
+        rate_limiter.on_rate_limited(e.response.headers)
+
+    if not is_retryable(e) or attempt >= image_retries:
+        circuit_breaker.record_failure()
+        raise e
+
+    # full jitter over a capped exponential window
+    delay = random.uniform(0, min(retry_max_delay, retry_base_delay * 2**attempt))
+    print(f"request failed ({e}), retry {attempt + 1}/{image_retries} in {delay:.1f}s")
+
+    return delay
+
+
+def on_request_success(headers):
+    rate_limiter.on_success(headers)
+    circuit_breaker.record_success()
+
+
+def gen_image_bytes_from_openai(prompt: str, size: str) -> bytes:
+    # checked once per card, so a probe keeps its retries
+    circuit_breaker.check()
+
+    for attempt in range(image_retries + 1):
+        rate_limiter.acquire()
+
+        try:
+            response = client.images.with_raw_response.generate(
+                model=openai_model, prompt=prompt, size=size
+            )
+        except APIError as e:
+            time.sleep(on_request_error(e, attempt))
+            continue
+
+        on_request_success(response.headers)
+
+        # response comes in base64
+        return base64.b64decode(response.parse().data[0].b64_json)
+
+
 def gen_image_from_openai(prompt: str, size: str) -> Image.Image:
-    result = client.images.generate(model="gpt-image-1", prompt=prompt, size=size)
+    return decode_image_bytes(gen_image_bytes_from_openai(prompt, size))
 
-    # response comes in base64
-    image_base64 = result.data[0].b64_json
-    image_bytes = base64.b64decode(image_base64)
 
-    return Image.open(io.BytesIO(image_bytes)).convert("RGBA")
+async def gen_image_bytes_from_openai_async(
+    aclient: "AsyncOpenAI", prompt: str, size: str
+) -> bytes:
+    # checked once per card, so a probe keeps its retries
+    circuit_breaker.check()
+
+    for attempt in range(image_retries + 1):
+        await rate_limiter.acquire_async()
+
+        try:
+            response = await aclient.images.with_raw_response.generate(
+                model=openai_model, prompt=prompt, size=size
+            )
+        except APIError as e:
+            await asyncio.sleep(on_request_error(e, attempt))
+            continue
+
+        on_request_success(response.headers)
+
+        # response comes in base64
+        return base64.b64decode(response.parse().data[0].b64_json)
+
+
+# art cache
+def art_cache_path(prompt: str, size: str, variant: int = 0) -> Optional[str]:
+    if not art_cache_dir:
+        return None
+
+    key = json.dumps([openai_model, size, prompt, variant])
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    return os.path.join(art_cache_dir, digest + ".png")
+
+
+def read_cached_art(path: str) -> Image.Image:
+    with Image.open(path) as im:
+        return im.convert("RGBA")
+
+
+def write_file_atomic(path: str, data: bytes):
+    # write to a temp file first so an interrupted run never leaves a partial file
+    ensure_dir(os.path.dirname(path))
+    tmp_path = temp_path_for(path)
+
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+
+    os.replace(tmp_path, path)
+
+
+def load_card_art(prompt: str, size: str, variant: int = 0) -> Image.Image:
+    path = art_cache_path(prompt, size, variant)
+
+    if path and os.path.exists(path):
+        return read_cached_art(path)
+
+    image_bytes = gen_image_bytes_from_openai(prompt, size)
+
+    if path:
+        write_file_atomic(path, image_bytes)
+
+    return decode_image_bytes(image_bytes)
+
+
+async def load_card_art_async(
+    aclient: "AsyncOpenAI",
+    prompt: str,
+    size: str,
+    semaphore: asyncio.Semaphore,
+    variant: int = 0,
+) -> Image.Image:
+    path = art_cache_path(prompt, size, variant)
+
+    # cache hits do not take a request slot
+    if path and os.path.exists(path):
+        return await asyncio.to_thread(read_cached_art, path)
+
+    async with semaphore:
+        image_bytes = await gen_image_bytes_from_openai_async(aclient, prompt, size)
+
+    if path:
+        await asyncio.to_thread(write_file_atomic, path, image_bytes)
+
+    # decoding is cpu bound, keep it off the event loop
+    return await asyncio.to_thread(decode_image_bytes, image_bytes)
 
 
 # drawing helpers
@@ -279,92 +727,303 @@ def symbol_for(card: Card) -> str:
 
 
 def get_symbol_image_path(card: Card) -> Optional[str]:
-    if card.kind in SYMBOL_IMAGES and os.path.exists(SYMBOL_IMAGES[card.kind]):
+    if card.kind in SYMBOL_IMAGES and symbol_exists(SYMBOL_IMAGES[card.kind]):
         return SYMBOL_IMAGES[card.kind]
 
     return None
 
 
-def draw_card_base(bg_rgb: Tuple[int, int, int]) -> Image.Image:
-    img = Image.new("RGBA", (CARD_W, CARD_H), (0, 0, 0, 0))
+@functools.lru_cache(maxsize=None)
+def symbol_exists(path: str) -> bool:
+    return os.path.exists(path)
+
+
+@functools.lru_cache(maxsize=None)
+def load_corner_symbol(path: str, scale: int = 1) -> Tuple[Image.Image, Image.Image]:
+    """decoded, resized and pre-rotated corner symbol, built once per path"""
+    with Image.open(path) as im:
+        # resize to fit in corner
+        size = SYMBOL_SIZE * scale
+        symbol_img = im.convert("RGBA").resize((size, size), Image.LANCZOS)
+
+    return symbol_img, symbol_img.rotate(180, expand=True)
+
+
+def image_nbytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+class ImageCache:
+    """least recently used images, bounded by their decoded size in bytes"""
+
+    def __init__(self, max_mb: str, cards: int):
+        # budget in MB, or room for this many full cards at the render scale
+        self.max_mb = max(0.0, float(max_mb)) if max_mb else None
+        self.cards = cards
+        self.nbytes = 0
+        self.images: "OrderedDict[Tuple, Image.Image]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Image.Image]:
+        with self.lock:
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+
+            return image
+
+    @property
+    def max_bytes(self) -> int:
+        if self.max_mb is not None:
+            return int(self.max_mb * 1024 * 1024)
+
+        scale = render_scale()
+
+        return self.cards * CARD_W * scale * CARD_H * scale * 4
+
+    def put(self, key: Tuple, image: Image.Image):
+        size = image_nbytes(image)
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            old = self.images.pop(key, None)
+            if old is not None:
+                self.nbytes -= image_nbytes(old)
+
+            self.images[key] = image
+            self.nbytes += size
+
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.images.popitem(last=False)
+                self.nbytes -= image_nbytes(evicted)
+
+
+# card base templates by (color, border color, card size), kept across decks
+# so long running services reuse them
+card_base_cache = ImageCache(card_base_cache_mb, len(COLOR_THEME))
+
+
+def build_card_base(
+    bg_rgb: Tuple[int, int, int],
+    border_rgb: Tuple[int, int, int],
+    scale: int = 1,
+    top: int = 0,
+    height: Optional[int] = None,
+) -> Image.Image:
+    """card base, or only the rows from top to top + height of it"""
+    w, h = CARD_W * scale, CARD_H * scale
+    border = BORDER * scale
+    img = Image.new("RGBA", (w, height or h), (0, 0, 0, 0))
     d = ImageDraw.Draw(img)
 
     # outer border with configurable color
-    border_rgb = parse_border_color(border_color)
-    rounded_rect(d, (0, 0, CARD_W - 1, CARD_H - 1), RADIUS + 8, border_rgb)
+    rounded_rect(
+        d, (0, -top, w - 1, h - 1 - top), (RADIUS + BORDER) * scale, border_rgb
+    )
 
     # inner color face
-    rounded_rect(d, (8, 8, CARD_W - 9, CARD_H - 9), RADIUS, bg_rgb)
+    rounded_rect(
+        d,
+        (border, border - top, w - 1 - border, h - 1 - border - top),
+        RADIUS * scale,
+        bg_rgb,
+    )
 
     return img
 
 
-def paste_into_ellipse(card_img: Image.Image, art: Image.Image) -> Image.Image:
-    x0, y0 = ELLIPSE_MARGIN, ELLIPSE_MARGIN
-    x1, y1 = CARD_W - ELLIPSE_MARGIN, CARD_H - ELLIPSE_MARGIN
-    W, H = x1 - x0, y1 - y0
+@functools.lru_cache(maxsize=None)
+def load_font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(path, size)
 
-    # scale background image to full card width for better coverage
-    art_aspect = art.width / art.height
-    new_w = CARD_W
-    new_h = int(CARD_W / art_aspect)
-    art_resized = art.resize((new_w, new_h), Image.LANCZOS)
 
-    # crop the ellipse area from the center
-    left = (new_w - W) // 2
-    top = (new_h - H) // 2
-    crop = art_resized.crop((left, top, left + W, top + H))
+def corner_font(scale: int) -> ImageFont.FreeTypeFont:
+    return FONT_BIG if scale == 1 else load_font(TEXT_FONT_PATH, 200 * scale)
+
+
+@functools.lru_cache(maxsize=None)
+def load_glyph_sprite(
+    text: str, font: ImageFont.FreeTypeFont, fill: Tuple[int, int, int]
+) -> Tuple[Image.Image, Image.Image, Tuple[int, int, int, int]]:
+    """upright and rotated text sprites sized to the glyph bounding box"""
+    bbox = font.getbbox(text)
+    left, top, right, bottom = bbox
+
+    sprite = Image.new("RGBA", (right - left, bottom - top), (0, 0, 0, 0))
+    ImageDraw.Draw(sprite).text((-left, -top), text, font=font, fill=fill)
+
+    return sprite, sprite.rotate(180, expand=True), bbox
+
+
+def draw_card_base(bg_rgb: Tuple[int, int, int], scale: int = 1) -> Image.Image:
+    key = (bg_rgb, border_color, CARD_W * scale, CARD_H * scale)
+    base = card_base_cache.get(key)
+
+    if base is None:
+        base = build_card_base(bg_rgb, parse_border_color(border_color), scale)
+        card_base_cache.put(key, base)
+
+    # callers draw on the result, hand out a copy of the template
+    return base.copy()
+
+
+# rotated ellipse masks by (size, rotation), read only once built
+ellipse_mask_cache: Dict[Tuple, Image.Image] = {}
 
+
+def build_ellipse_mask(W: int, H: int, rotation: float) -> Image.Image:
     # create mask for ellipse
     mask = Image.new("L", (W, H), 0)
     md = ImageDraw.Draw(mask)
     md.ellipse((0, 0, W, H), fill=255)
 
-    if abs(ellipse_rotation) > 0.1:
+    if abs(rotation) > 0.1:
         # rotate only the mask, keep the background image straight
-        mask = mask.rotate(-ellipse_rotation, expand=False, center=(W // 2, H // 2))
+        mask = mask.rotate(-rotation, expand=False, center=(W // 2, H // 2))
+
+    return mask
+
+
+def get_ellipse_mask(W: int, H: int) -> Image.Image:
+    key = (W, H, ellipse_rotation)
+    mask = ellipse_mask_cache.get(key)
+
+    if mask is not None:
+        return mask
+
+    path = None
+    if mask_cache_dir:
+        path = os.path.join(
+            mask_cache_dir, f"ellipse-{W}x{H}-r{ellipse_rotation:g}.png"
+        )
+
+    if path and os.path.exists(path):
+        with Image.open(path) as im:
+            mask = im.convert("L")
+    else:
+        mask = build_ellipse_mask(W, H, ellipse_rotation)
+
+        if path:
+            buf = io.BytesIO()
+            mask.save(buf, "PNG")
+            write_file_atomic(path, buf.getvalue())
+
+    ellipse_mask_cache[key] = mask
+
+    return mask
+
+
+# fitted art by (source hash, target size), shared art is resampled once per run
+fitted_art_cache = ImageCache(fitted_art_cache_mb, 4)
+
+
+def fit_art_geometry(
+    art: Image.Image, W: int, H: int, card_w: int
+) -> Tuple[int, int, int, int]:
+    # scale background image to full card width for better coverage
+    art_aspect = art.width / art.height
+    new_w = card_w
+    new_h = int(card_w / art_aspect)
+
+    # crop the ellipse area from the center
+    left = (new_w - W) // 2
+    top = (new_h - H) // 2
+
+    return new_w, new_h, left, top
+
+
+def fit_art(art: Image.Image, W: int, H: int, card_w: int = CARD_W) -> Image.Image:
+    new_w, new_h, left, top = fit_art_geometry(art, W, H, card_w)
+    art_resized = art.resize((new_w, new_h), Image.LANCZOS)
+
+    return art_resized.crop((left, top, left + W, top + H))
+
+
+def fit_art_scaled(art: Image.Image, W: int, H: int, scale: int) -> Image.Image:
+    # one resample from the source straight to the final geometry
+    if single_resample_art:
+        return fit_art(art, W * scale, H * scale, CARD_W * scale)
+
+    crop = fit_art(art, W, H)
+
+    # the art keeps its card size look, only the vector parts gain resolution
+    if scale > 1:
+        crop = crop.resize((W * scale, H * scale), Image.LANCZOS)
+
+    return crop
 
-    card_img.paste(crop, (x0, y0), mask)
+
+def get_fitted_art(art: Image.Image, W: int, H: int, scale: int = 1) -> Image.Image:
+    # crops larger than the whole budget would never be kept, skip the hashing
+    if W * H * scale * scale * len(art.getbands()) > fitted_art_cache.max_bytes:
+        return fit_art_scaled(art, W, H, scale)
+
+    key = (image_digest(art), CARD_W, W, H, scale, single_resample_art)
+    crop = fitted_art_cache.get(key)
+
+    if crop is None:
+        crop = fit_art_scaled(art, W, H, scale)
+        fitted_art_cache.put(key, crop)
+
+    return crop
+
+
+def paste_into_ellipse(
+    card_img: Image.Image, art: Image.Image, scale: int = 1
+) -> Image.Image:
+    x0, y0 = ELLIPSE_MARGIN, ELLIPSE_MARGIN
+    x1, y1 = CARD_W - ELLIPSE_MARGIN, CARD_H - ELLIPSE_MARGIN
+    W, H = x1 - x0, y1 - y0
+
+    card_img.paste(
+        get_fitted_art(art, W, H, scale),
+        (x0 * scale, y0 * scale),
+        get_ellipse_mask(W * scale, H * scale),
+    )
 
     return card_img
 
 
-def draw_corners(card_img: Image.Image, card: Card):
+def corner_sprites(
+    card: Card, scale: int, w: int, h: int
+) -> List[Tuple[Image.Image, Tuple[int, int]]]:
+    margin = MARGIN * scale
+
     # use symbol image
     symbol_img_path = get_symbol_image_path(card)
 
     if symbol_img_path:
-        # load and paste symbol image
-        symbol_img = Image.open(symbol_img_path).convert("RGBA")
-        # resize to fit in corner
-        symbol_img = symbol_img.resize((120, 120), Image.LANCZOS)
-
-        # top left
-        card_img.alpha_composite(symbol_img, (MARGIN, MARGIN))
+        symbol_img, rotated_symbol = load_corner_symbol(symbol_img_path, scale)
 
-        # bottom right rotated
-        rotated_symbol = symbol_img.rotate(180, expand=True)
-        card_img.alpha_composite(
-            rotated_symbol,
+        return [
+            # top left
+            (symbol_img, (margin, margin)),
+            # bottom right rotated
             (
-                CARD_W - MARGIN - rotated_symbol.width,
-                CARD_H - MARGIN - rotated_symbol.height,
+                rotated_symbol,
+                (
+                    w - margin - rotated_symbol.width,
+                    h - margin - rotated_symbol.height,
+                ),
             ),
-        )
-    else:
-        # for numbers, draw text
-        d = ImageDraw.Draw(card_img)
-        s = symbol_for(card)
-        d.text((MARGIN, MARGIN), s, font=FONT_BIG, fill=WHITE)
+        ]
+
+    # for numbers, use the pre-rendered glyph sprites
+    glyph, rotated_glyph, (left, top, right, bottom) = load_glyph_sprite(
+        symbol_for(card), corner_font(scale), WHITE
+    )
 
+    return [
+        (glyph, (margin + left, margin + top)),
         # bottom right rotated
-        tmp = Image.new("RGBA", (400, 400), (0, 0, 0, 0))
-        td = ImageDraw.Draw(tmp)
-        td.text((0, 0), s, font=FONT_BIG, fill=WHITE)
-        tmp = tmp.rotate(180, expand=True)
-        card_img.alpha_composite(
-            tmp, (CARD_W - MARGIN - tmp.width, CARD_H - MARGIN - tmp.height)
-        )
+        (rotated_glyph, (w - margin - right, h - margin - bottom)),
+    ]
+
+
+def draw_corners(card_img: Image.Image, card: Card, scale: int = 1):
+    for sprite, dest in corner_sprites(card, scale, *card_img.size):
+        card_img.alpha_composite(sprite, dest)
 
 
 def filename_for(card: Card) -> str:
@@ -374,10 +1033,23 @@ def filename_for(card: Card) -> str:
         base += f"_{card.value}"
 
     base += f"-x{card.copy_index}"
-    return base + ".png"
+    return base + (".jpg" if card_format == "jpeg" else ".png")
+
+
+def render_scale() -> int:
+    return max(1, upscale_factor) if native_render else 1
 
 
 def render_card(card: Card, art: Image.Image) -> Image.Image:
+    # draw shapes, mask and glyphs straight at the final resolution
+    if native_render:
+        scale = render_scale()
+        base = draw_card_base(color_rgb(card.color), scale)
+        base = paste_into_ellipse(base, art, scale)
+        draw_corners(base, card, scale)
+
+        return base
+
     base = draw_card_base(color_rgb(card.color))
     base = paste_into_ellipse(base, art)
     draw_corners(base, card)
@@ -391,130 +1063,1644 @@ def render_card(card: Card, art: Image.Image) -> Image.Image:
     return base
 
 
-# build and export
-def load_test_background() -> Image.Image:
-    if not os.path.exists(test_background_path):
-        raise FileNotFoundError(
-            f"Test background image not found: {test_background_path}"
-        )
+# strip rendering
+class PngStreamWriter:
+    """writes a png strip by strip, only one strip is held in memory"""
 
-    return Image.open(test_background_path).convert("RGBA")
+    def __init__(self, out: Union[str, BinaryIO], width: int, height: int):
+        # a path is written through a temp file, a stream as it goes
+        self.path = out if isinstance(out, str) else None
+        self.mode = "RGBA" if png_alpha else "RGB"
+        self.z = zlib.compressobj(png_compress_level)
+        self.prev_row = Image.new(self.mode, (width, 1))
 
+        if self.path:
+            self.tmp_path = temp_path_for(self.path)
+            self.f = open(self.tmp_path, "wb")
+        else:
+            self.f = out
 
-def ensure_dir(path: str):
-    """ensure directory exists"""
-    os.makedirs(path, exist_ok=True)
+        self.f.write(b"\x89PNG\r\n\x1a\n")
+        color_type = 6 if png_alpha else 2
+        self.chunk(
+            b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+        )
 
+    def chunk(self, kind: bytes, data: bytes):
+        self.f.write(struct.pack(">I", len(data)) + kind + data)
+        self.f.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
 
-def generate_all_cards() -> List[str]:
-    ensure_dir(OUTPUT_DIR)
-    deck = build_uno_deck()
-    saved: List[str] = []
+    def write_strip(self, strip: Image.Image):
+        if not png_alpha:
+            strip = flatten_alpha(strip)
 
-    # load test background once if in test mode
-    test_bg = load_test_background() if test_mode else None
+        w, h = strip.size
 
-    for i, card in enumerate(deck, 1):
-        if test_mode:
-            print(
-                f"[{i:03d}/108] test mode: {card.color} {card.kind} {card.value if card.value is not None else ''} -> using test background"
-            )
-            art = test_bg
-        else:
-            prompt = prompt_for_card(card)
-            print(
-                f"[{i:03d}/108] {card.color} {card.kind} {card.value if card.value is not None else ''} -> {prompt}"
-            )
-            art = gen_image_from_openai(prompt, openai_size)
+        # up filter: each row minus the row above it, modulo 256
+        above = Image.new(self.mode, (w, h))
+        above.paste(self.prev_row, (0, 0))
+        above.paste(strip.crop((0, 0, w, h - 1)), (0, 1))
+        filtered = ImageChops.subtract_modulo(strip, above).tobytes()
 
-        card_img = render_card(card, art)
-        out_path = os.path.join(OUTPUT_DIR, filename_for(card))
-        card_img.save(out_path, "PNG")
-        saved.append(out_path)
+        stride = w * len(self.mode)
+        rows = b"".join(
+            b"\x02" + filtered[i : i + stride] for i in range(0, len(filtered), stride)
+        )
+        self.chunk(b"IDAT", self.z.compress(rows))
+        self.prev_row = strip.crop((0, h - 1, w, h))
 
-        # gentle pacing to avoid rate limiting
-        if not test_mode:
-            time.sleep(0.6)
+    def close(self):
+        self.chunk(b"IDAT", self.z.flush())
+        self.chunk(b"IEND", b"")
 
-        # stop after first card if generate_first_only is enabled
-        if generate_first_only:
-            print(f"stopping after first card (generate_first_only=true)")
+        if self.path:
+            self.f.close()
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self.path:
+            self.f.close()
+            os.remove(self.tmp_path)
+
+
+def strip_rendering() -> bool:
+    return strip_height > 0 and native_render and card_format == "png"
+
+
+def ellipse_mask_rows(W: int, H: int, top: int, bottom: int) -> Image.Image:
+    """rows top to bottom of the rotated ellipse mask, drawn as a polygon"""
+    theta = math.radians(ellipse_rotation)
+    cos_t, sin_t = math.cos(theta), math.sin(theta)
+    steps = max(720, W + H)
+    points = []
+
+    for i in range(steps):
+        t = 2 * math.pi * i / steps
+        x, y = W / 2 * math.cos(t), H / 2 * math.sin(t)
+        points.append(
+            (W / 2 + x * cos_t - y * sin_t, H / 2 + x * sin_t + y * cos_t - top)
+        )
+
+    mask = Image.new("L", (W, bottom - top), 0)
+    ImageDraw.Draw(mask).polygon(points, fill=255)
+
+    return mask
+
+
+def fitted_art_rows(
+    art: Image.Image, W: int, H: int, scale: int, top: int, bottom: int
+) -> Image.Image:
+    """rows top to bottom of the fitted art at the final size"""
+    if single_resample_art:
+        src = art
+        new_w, new_h, left, crop_top = fit_art_geometry(
+            art, W * scale, H * scale, CARD_W * scale
+        )
+        sx, sy = art.width / new_w, art.height / new_h
+        box = (
+            left * sx,
+            (crop_top + top) * sy,
+            (left + W * scale) * sx,
+            (crop_top + bottom) * sy,
+        )
+    else:
+        src = get_fitted_art(art, W, H)
+        box = (0, top / scale, W, bottom / scale)
+
+    # resampling a box reads the neighbouring source pixels too, so strips join
+    return src.resize((W * scale, bottom - top), Image.LANCZOS, box=box)
+
+
+def render_card_strips(card: Card, art: Image.Image, out: Union[str, BinaryIO]):
+    scale = render_scale()
+    w, h = CARD_W * scale, CARD_H * scale
+    bg_rgb = color_rgb(card.color)
+    border_rgb = parse_border_color(border_color)
+    sprites = corner_sprites(card, scale, w, h)
+
+    # ellipse area in final pixels
+    margin = ELLIPSE_MARGIN * scale
+    W, H = CARD_W - 2 * ELLIPSE_MARGIN, CARD_H - 2 * ELLIPSE_MARGIN
+
+    png = PngStreamWriter(out, w, h)
+
+    try:
+        for y0 in range(0, h, strip_height):
+            y1 = min(h, y0 + strip_height)
+            strip = build_card_base(bg_rgb, border_rgb, scale, y0, y1 - y0)
+
+            top, bottom = max(y0, margin), min(y1, margin + H * scale)
+            if top < bottom:
+                rows = (top - margin, bottom - margin)
+                strip.paste(
+                    fitted_art_rows(art, W, H, scale, *rows),
+                    (margin, top - y0),
+                    ellipse_mask_rows(W * scale, H * scale, *rows),
+                )
+
+            for sprite, (x, y) in sprites:
+                if y < y1 and y + sprite.height > y0:
+                    skip = max(0, y0 - y)
+                    strip.alpha_composite(
+                        sprite,
+                        (x, y + skip - y0),
+                        (0, skip, sprite.width, sprite.height),
+                    )
+
+            png.write_strip(strip)
+    except BaseException:
+        png.abort()
+        raise
+
+    png.close()
+
+
+def render_to_file(card: Card, art: Image.Image, out_path: str):
+    if strip_rendering():
+        render_card_strips(card, art, out_path)
+    else:
+        save_card_atomic(render_card(card, art), out_path)
+
+
+def render_in_memory(card: Card, art: Image.Image) -> Union[Image.Image, bytes]:
+    """rendered card for the pdf, strip rendering returns the encoded png"""
+    if strip_rendering():
+        buf = io.BytesIO()
+        render_card_strips(card, art, buf)
+        return buf.getvalue()
+
+    return render_card(card, art)
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """peak of this process, or of the largest finished worker process"""
+    if resource is None:
+        return None
+
+    # linux reports kilobytes, macos bytes
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+# build and export
+def load_test_background() -> Image.Image:
+    if not os.path.exists(test_background_path):
+        raise FileNotFoundError(
+            f"Test background image not found: {test_background_path}"
+        )
+
+    return Image.open(test_background_path).convert("RGBA")
+
+
+def ensure_dir(path: str):
+    """ensure directory exists"""
+    os.makedirs(path, exist_ok=True)
+
+
+def card_path(card: Card, output_dir: Optional[str] = None) -> str:
+    return os.path.join(output_dir or OUTPUT_DIR, filename_for(card))
+
+
+def temp_path_for(path: str) -> str:
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def flatten_alpha(card_img: Image.Image) -> Image.Image:
+    """card on white paper, so the file needs no alpha channel"""
+    flat = Image.new("RGB", card_img.size, WHITE)
+    flat.paste(card_img, mask=card_img.getchannel("A"))
+
+    return flat
+
+
+def encode_card_image(card_img: Image.Image, f: Union[str, BinaryIO]):
+    if card_format == "jpeg":
+        flatten_alpha(card_img).save(f, "JPEG", quality=jpeg_quality)
+        return
+
+    if not png_alpha:
+        card_img = flatten_alpha(card_img)
+
+    card_img.save(f, "PNG", compress_level=png_compress_level)
+
+
+def save_card_atomic(card_img: Image.Image, out_path: str):
+    # replacing the file also detaches any hardlinked duplicate
+    tmp_path = temp_path_for(out_path)
+    encode_card_image(card_img, tmp_path)
+    os.replace(tmp_path, out_path)
+
+
+def duplicate_file(src: str, dst: str):
+    tmp_path = temp_path_for(dst)
+
+    if duplicate_mode == "hardlink":
+        os.link(src, tmp_path)
+    else:
+        shutil.copyfile(src, tmp_path)
+
+    os.replace(tmp_path, dst)
+
+
+def write_card(
+    card: Card,
+    prompt: str,
+    art: Image.Image,
+    card_img: Optional[Image.Image],
+    manifest: "Manifest",
+    twin: Optional[str] = None,
+) -> str:
+    out_path = manifest.card_path(card)
+
+    # identical render already on disk, reuse its file
+    if twin:
+        duplicate_file(twin, out_path)
+    elif card_img is not None:
+        save_card_atomic(card_img, out_path)
+
+    manifest.record(card, prompt, art)
+
+    return out_path
+
+
+def save_card(
+    card: Card,
+    art: Image.Image,
+    prompt: str,
+    manifest: "Manifest",
+    deduper: "RenderDeduper",
+    pdf: Optional["PdfDeckWriter"] = None,
+) -> str:
+    twin = deduper.claim(card, art)
+
+    if pdf is not None:
+        add_to_pdf(card, art, None, twin, deduper, pdf)
+        return manifest.card_path(card)
+
+    if not twin:
+        render_to_file(card, art, manifest.card_path(card))
+
+    return write_card(card, prompt, art, None, manifest, twin)
+
+
+def add_to_pdf(
+    card: Card,
+    art: Image.Image,
+    rendered: Union[Image.Image, bytes, None],
+    twin: Optional[str],
+    deduper: "RenderDeduper",
+    pdf: "PdfDeckWriter",
+):
+    # identical render still in memory, draw it again
+    if rendered is None and twin:
+        rendered = deduper.render_of(twin)
+
+    if rendered is None:
+        rendered = render_in_memory(card, art)
+
+    deduper.keep(card, twin or card_path(card, deduper.output_dir), rendered)
+    pdf.add(rendered)
+
+
+class PngWriterPool:
+    """encodes and writes cards on background threads, copies wait for their twin"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers) if workers else None
+        self.pending = OrderedDict()
+
+    def submit(
+        self,
+        card: Card,
+        prompt: str,
+        art: Image.Image,
+        card_img: Optional[Image.Image],
+        manifest: "Manifest",
+        twin: Optional[str],
+    ):
+        if self.executor is None:
+            write_card(card, prompt, art, card_img, manifest, twin)
+            return
+
+        # a twin still pending is written first, finished ones left the queue
+        source = self.pending.get(twin)
+
+        def write():
+            if source is not None:
+                source.result()
+
+            write_card(card, prompt, art, card_img, manifest, twin)
+
+        self.pending[manifest.card_path(card)] = self.executor.submit(write)
+
+        # bound the rendered images held in memory
+        while len(self.pending) > 2 * self.workers:
+            self.pending.popitem(last=False)[1].result()
+
+    def close(self):
+        try:
+            while self.pending:
+                self.pending.popitem(last=False)[1].result()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+
+
+# render deduplication
+def card_face(card: Card) -> Tuple[str, str, Optional[int]]:
+    return card.color, card.kind, card.value
+
+
+class RenderDeduper:
+    """remembers the first card file of every distinct render in a run"""
+
+    def __init__(self, output_dir: str, keep_for: Optional[List[Card]] = None):
+        self.output_dir = output_dir
+        self.fingerprint = config_fingerprint()
+        self.seen = {}
+
+        # without png files a render stays in memory until the last card that
+        # could be its copy has been added
+        self.remaining = Counter()
+        if keep_for and dedupe_renders:
+            self.remaining.update(card_face(card) for card in keep_for)
+        self.renders = {}
+
+    def claim(self, card: Card, art: Image.Image) -> Optional[str]:
+        """returns the file of an identical card claimed earlier, if any"""
+        if not dedupe_renders:
+            return None
+
+        key = (*card_face(card), image_digest(art), self.fingerprint)
+
+        if key in self.seen:
+            return self.seen[key]
+
+        self.seen[key] = card_path(card, self.output_dir)
+
+        return None
+
+    def keep(self, card: Card, path: str, rendered: Union[Image.Image, bytes]):
+        face = card_face(card)
+        if self.remaining[face] <= 0:
+            return
+
+        self.remaining[face] -= 1
+
+        if self.remaining[face] > 0:
+            self.renders.setdefault(path, (face, rendered))
+            return
+
+        # last card with this face, no later copy can reuse its renders
+        for kept in [p for p, (f, _) in self.renders.items() if f == face]:
+            del self.renders[kept]
+
+    def render_of(self, path: str) -> Union[Image.Image, bytes, None]:
+        kept = self.renders.get(path)
+
+        return kept[1] if kept else None
+
+
+# resumable builds
+def config_fingerprint() -> str:
+    config = {
+        "test_mode": test_mode,
+        "model": openai_model,
+        "size": openai_size,
+        "variants": art_variants,
+        "upscale_factor": upscale_factor,
+        "native_render": native_render,
+        "single_resample_art": single_resample_art,
+        "strip_rendering": strip_rendering(),
+        "ellipse_rotation": ellipse_rotation,
+        "border_color": border_color,
+        "png_alpha": png_alpha,
+        "card_format": card_format,
+        "jpeg_quality": jpeg_quality,
+        "png_compress_level": png_compress_level,
+    }
+    data = json.dumps(config, sort_keys=True).encode("utf-8")
+
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def image_digest(im: Image.Image) -> str:
+    # computed once per image, shared art and renders are hashed a single time
+    if "sha256" not in im.info:
+        im.info["sha256"] = hashlib.sha256(im.tobytes()).hexdigest()
+
+    return im.info["sha256"]
+
+
+class Manifest:
+    """checkpoint of finished cards in an output dir, rewritten after every card"""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, "manifest.json")
+        self.fingerprint = config_fingerprint()
+        self.cards = {}
+        self.lock = threading.Lock()
+
+        try:
+            with open(self.path) as f:
+                self.cards = json.load(f).get("cards", {})
+        except (OSError, ValueError):
+            pass
+
+    def card_path(self, card: Card) -> str:
+        return card_path(card, self.output_dir)
+
+    def is_done(self, card: Card) -> bool:
+        entry = self.cards.get(filename_for(card))
+        path = self.card_path(card)
+
+        # prompts are deterministic, an edited theme or style redraws the card
+        if entry is not None and not test_mode:
+            if entry.get("prompt") != prompt_for_card(card):
+                return False
+
+        return (
+            entry is not None
+            and entry["config"] == self.fingerprint
+            and os.path.exists(path)
+            and os.path.getsize(path) == entry["bytes"]
+        )
+
+    def record(self, card: Card, prompt: str, art: Image.Image):
+        path = self.card_path(card)
+        entry = {
+            "path": path,
+            "prompt": prompt,
+            "art_sha256": image_digest(art),
+            "config": self.fingerprint,
+            "bytes": os.path.getsize(path),
+        }
+
+        with self.lock:
+            self.cards[filename_for(card)] = entry
+            data = json.dumps({"cards": self.cards}, indent=2).encode("utf-8")
+            write_file_atomic(self.path, data)
+
+
+def card_label(card: Card) -> str:
+    return f"{card.color} {card.kind} {card.value if card.value is not None else ''}"
+
+
+# art planning
+@dataclass
+class ArtJob:
+    prompt: str
+    variant: int = 0
+    cards: List[int] = field(default_factory=list)
+
+
+def plan_art_jobs(prompts: List[str]) -> Tuple[List[ArtJob], List[int]]:
+    """group cards by prompt, returns the jobs and the job index of each card"""
+    jobs: List[ArtJob] = []
+    job_index = {}
+    group_sizes = {}
+    card_jobs: List[int] = []
+
+    for i, prompt in enumerate(prompts):
+        # copies of the same prompt cycle through the configured variants
+        position = group_sizes.get(prompt, 0)
+        group_sizes[prompt] = position + 1
+        key = (prompt, position % art_variants)
+
+        if key not in job_index:
+            job_index[key] = len(jobs)
+            jobs.append(ArtJob(prompt=prompt, variant=key[1]))
+
+        jobs[job_index[key]].cards.append(i)
+        card_jobs.append(job_index[key])
+
+    return jobs, card_jobs
+
+
+def iter_card_art(
+    deck: List[Card],
+    test_bg: Optional[Image.Image],
+    failed: List[Tuple[Card, Exception]],
+) -> Iterator[Tuple[Card, str, Image.Image]]:
+    """yield art in deck order, cards whose art could not be fetched go to failed"""
+    # test mode: same background for every card
+    if test_mode:
+        for i, card in enumerate(deck, 1):
+            print(
+                f"[{i:03d}/108] test mode: {card_label(card)} -> using test background"
+            )
+            yield card, "", test_bg
+        return
+
+    # prompts are built upfront so the deck order stays deterministic
+    prompts = [prompt_for_card(card) for card in deck]
+    jobs, card_jobs = plan_art_jobs(prompts)
+    print(f"planned {len(jobs)} art generations for {len(deck)} cards")
+
+    if art_workers == 1:
+        results = {}
+
+        for i, (card, j) in enumerate(zip(deck, card_jobs), 1):
+            job = jobs[j]
+            print(f"[{i:03d}/108] {card_label(card)} -> {job.prompt}")
+
+            if j not in results:
+                try:
+                    results[j] = load_card_art(job.prompt, openai_size, job.variant)
+                except Exception as e:
+                    results[j] = e
+
+            if isinstance(results[j], Exception):
+                failed.append((card, results[j]))
+            else:
+                yield card, job.prompt, results[j]
+
+            # release the art once its last card is done
+            if job.cards[-1] == i - 1:
+                del results[j]
+        return
+
+    # bounded pool of fetchers, results are consumed in deck order and only a
+    # window of jobs ahead of the consumer is in flight to cap memory
+    window = art_workers * 2
+    futures = {}
+
+    with ThreadPoolExecutor(max_workers=art_workers) as executor:
+
+        def submit_until(last_job: int):
+            for k in range(len(futures), min(last_job + 1, len(jobs))):
+                job = jobs[k]
+                futures[k] = executor.submit(
+                    load_card_art, job.prompt, openai_size, job.variant
+                )
+
+        try:
+            for i, (card, j) in enumerate(zip(deck, card_jobs), 1):
+                submit_until(j + window)
+                print(f"[{i:03d}/108] {card_label(card)} -> {jobs[j].prompt}")
+
+                try:
+                    art = futures[j].result()
+                except Exception as e:
+                    failed.append((card, e))
+                    art = None
+
+                if art is not None:
+                    yield card, jobs[j].prompt, art
+
+                # release the art once its last card is done
+                if jobs[j].cards[-1] == i - 1:
+                    futures[j] = None
+        finally:
+            for future in futures.values():
+                if future is not None:
+                    future.cancel()
+
+
+# staged pipeline
+def run_stage(
+    func: Callable,
+    inbox: queue.Queue,
+    outbox: Optional[queue.Queue],
+    errors: List[BaseException],
+):
+    """worker loop of one pipeline stage, None marks the end of the stream"""
+    while True:
+        item = inbox.get()
+
+        if item is None:
             break
 
-    return saved
+        # after a failure keep draining so upstream never blocks
+        if errors:
+            continue
 
+        try:
+            result = func(*item)
 
-def images_to_pdf(image_paths: List[str], pdf_path: str):
-    c = canvas.Canvas(pdf_path, pagesize=A4)
-    pw, ph = A4
+            if outbox is not None:
+                outbox.put(result)
+        except BaseException as e:
+            errors.append(e)
+
+    if outbox is not None:
+        outbox.put(None)
+
+
+def run_pipeline(
+    cards: Iterator[Tuple[Card, str, Image.Image]],
+    manifest: Manifest,
+    deduper: RenderDeduper,
+    pdf: Optional["PdfDeckWriter"] = None,
+):
+    """fetch -> render -> encode/write, bounded queues give backpressure"""
+    render_queue = queue.Queue(maxsize=max(1, pipeline_queue_size))
+    write_queue = queue.Queue(maxsize=max(1, pipeline_queue_size))
+    errors: List[BaseException] = []
+
+    if render_processes > 0:
+        run_process_pipeline(cards, manifest, deduper, pdf, render_queue, errors)
+        return
+
+    # the writer runs in deck order, so a twin is always written before its copies
+    def render(card: Card, prompt: str, art: Image.Image):
+        twin = deduper.claim(card, art)
+        card_img = None
+
+        if not twin:
+            if pdf is not None:
+                card_img = render_in_memory(card, art)
+            elif strip_rendering():
+                # strips are streamed to disk as they are rendered
+                render_card_strips(card, art, manifest.card_path(card))
+            else:
+                card_img = render_card(card, art)
+
+        return card, prompt, art, card_img, twin
+
+    def write(
+        card: Card,
+        prompt: str,
+        art: Image.Image,
+        card_img: Union[Image.Image, bytes, None],
+        twin: Optional[str],
+    ):
+        if pdf is not None:
+            add_to_pdf(card, art, card_img, twin, deduper, pdf)
+        else:
+            writers.submit(card, prompt, art, card_img, manifest, twin)
+
+    writers = PngWriterPool(png_writers)
+    stages = [
+        threading.Thread(
+            target=run_stage, args=(render, render_queue, write_queue, errors)
+        ),
+        threading.Thread(target=run_stage, args=(write, write_queue, None, errors)),
+    ]
+
+    try:
+        feed_pipeline(cards, render_queue, stages, errors)
+    finally:
+        writers.close()
+
+
+def feed_pipeline(
+    cards: Iterator[Tuple[Card, str, Image.Image]],
+    inbox: queue.Queue,
+    stages: List[threading.Thread],
+    errors: List[BaseException],
+):
+    for stage in stages:
+        stage.start()
+
+    try:
+        # the fetch stage runs on the calling thread
+        for item in cards:
+            if errors:
+                break
+
+            inbox.put(item)
+    finally:
+        inbox.put(None)
+
+        for stage in stages:
+            stage.join()
+
+    if errors:
+        raise errors[0]
+
+
+# process pool rendering
+worker_art = {}
+
+
+def init_render_worker():
+    """preload fonts and symbol images once per worker process"""
+    scale = render_scale()
+    font = corner_font(scale)
+
+    for digit in range(10):
+        load_glyph_sprite(str(digit), font, WHITE)
+
+    for path in SYMBOL_IMAGES.values():
+        if symbol_exists(path):
+            load_corner_symbol(path, scale)
+
+
+def attach_shared_art(name: str, size: Tuple[int, int]) -> Image.Image:
+    # consecutive cards usually share art, keep the last one attached
+    if name not in worker_art:
+        shm = shared_memory.SharedMemory(name=name)
+        buf = shm.buf[: size[0] * size[1] * 4]
+
+        try:
+            art = Image.frombytes("RGBA", size, buf)
+        finally:
+            buf.release()
+            shm.close()
+
+        worker_art.clear()
+        worker_art[name] = art
+
+    return worker_art[name]
+
+
+def render_card_to_file(
+    card: Card, art_name: str, art_size: Tuple[int, int], out_path: str
+) -> str:
+    render_to_file(card, attach_shared_art(art_name, art_size), out_path)
+
+    return out_path
+
+
+def render_card_to_bytes(card: Card, art_name: str, art_size: Tuple[int, int]) -> bytes:
+    # whole cards are encoded here too, raw pixels are slow to send back
+    rendered = render_in_memory(card, attach_shared_art(art_name, art_size))
+
+    if isinstance(rendered, bytes):
+        return rendered
+
+    buf = io.BytesIO()
+    encode_card_image(rendered, buf)
+
+    return buf.getvalue()
+
+
+class SharedArtPool:
+    """art placed in shared memory once and unlinked after its last card"""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, art: Image.Image) -> str:
+        key = image_digest(art)
+
+        with self.lock:
+            if key not in self.entries:
+                data = art.convert("RGBA").tobytes()
+                shm = shared_memory.SharedMemory(create=True, size=len(data))
+                shm.buf[: len(data)] = data
+                self.entries[key] = [shm, 0]
+
+            entry = self.entries[key]
+            entry[1] += 1
+
+            return entry[0].name
+
+    def release(self, art: Image.Image):
+        key = image_digest(art)
+
+        with self.lock:
+            entry = self.entries[key]
+            entry[1] -= 1
+
+            if entry[1] == 0:
+                self.close_entry(self.entries.pop(key)[0])
+
+    def close(self):
+        with self.lock:
+            for shm, _ in self.entries.values():
+                self.close_entry(shm)
+
+            self.entries.clear()
+
+    @staticmethod
+    def close_entry(shm: shared_memory.SharedMemory):
+        shm.close()
+        shm.unlink()
+
+
+def run_process_pipeline(
+    cards: Iterator[Tuple[Card, str, Image.Image]],
+    manifest: Manifest,
+    deduper: RenderDeduper,
+    pdf: Optional["PdfDeckWriter"],
+    render_queue: queue.Queue,
+    errors: List[BaseException],
+):
+    """render stage fans out to worker processes, which also encode the png"""
+    # enough queued futures to keep every worker busy
+    done_queue = queue.Queue(maxsize=max(pipeline_queue_size, render_processes))
+    shared = SharedArtPool()
+    executor = ProcessPoolExecutor(
+        max_workers=render_processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_render_worker,
+    )
+
+    def submit(card: Card, prompt: str, art: Image.Image):
+        twin = deduper.claim(card, art)
 
-    # layout: exactly 3x3 cards per page
-    cards_per_row = 3
-    cards_per_column = 3
-    cards_per_page = cards_per_row * cards_per_column
+        if twin:
+            return card, prompt, art, None, twin
 
-    # minimal margins
-    margin = pw * 0.02  # 2 percent margin
-    spacing = pw * 0.015  # 1.5 percent spacing between cards
+        name = shared.acquire(art)
 
-    # calculate card dimensions to fit exactly 3x3
-    available_width = pw - (2 * margin) - (2 * spacing)
-    available_height = ph - (2 * margin) - (2 * spacing)
+        if pdf is not None:
+            future = executor.submit(render_card_to_bytes, card, name, art.size)
+        else:
+            future = executor.submit(
+                render_card_to_file, card, name, art.size, manifest.card_path(card)
+            )
+
+        return card, prompt, art, future, None
+
+    def collect(
+        card: Card,
+        prompt: str,
+        art: Image.Image,
+        future: Optional[Future],
+        twin: Optional[str],
+    ):
+        rendered = None
+
+        if twin:
+            if pdf is None:
+                duplicate_file(twin, manifest.card_path(card))
+        else:
+            try:
+                rendered = future.result()
+            finally:
+                shared.release(art)
+
+        if pdf is not None:
+            add_to_pdf(card, art, rendered, twin, deduper, pdf)
+        else:
+            manifest.record(card, prompt, art)
+
+    stages = [
+        threading.Thread(
+            target=run_stage, args=(submit, render_queue, done_queue, errors)
+        ),
+        threading.Thread(target=run_stage, args=(collect, done_queue, None, errors)),
+    ]
+
+    try:
+        feed_pipeline(cards, render_queue, stages, errors)
+    finally:
+        executor.shutdown(cancel_futures=True)
+        shared.close()
+
+
+def select_cards(manifest: Manifest) -> Tuple[List[Card], List[Card]]:
+    """returns the deck to export and the cards to generate in this run"""
+    deck = build_uno_deck()
+
+    # stop after first card if generate_first_only is enabled
+    if generate_first_only:
+        deck = deck[:1]
+
+    # the pdf is built from this run only, so every card is rendered
+    if not write_pngs:
+        return deck, deck
+
+    if only_cards:
+        selected = [
+            c for c in deck if os.path.splitext(filename_for(c))[0] in only_cards
+        ]
+        print(f"regenerating {len(selected)} selected cards (UNO_ONLY_CARDS)")
+        return deck, selected
+
+    if resume:
+        selected = [c for c in deck if not manifest.is_done(c)]
+
+        if len(selected) < len(deck):
+            print(f"resuming: {len(deck) - len(selected)} cards already done")
+
+        return deck, selected
+
+    return deck, deck
+
+
+def finish_generation(
+    deck: List[Card], failed: List[Tuple[Card, Exception]], manifest: Manifest
+) -> List[str]:
+    failed_list_path = os.path.join(manifest.output_dir, "failed-cards.txt")
 
-    card_width = available_width / cards_per_row
-    card_height = available_height / cards_per_column
+    if failed:
+        names = [os.path.splitext(filename_for(card))[0] for card, _ in failed]
 
-    # ensure aspect ratio is maintained
-    target_aspect = 825 / 1275
-    current_aspect = card_width / card_height
+        print(f"{len(failed)} card(s) failed:")
+        for card, e in failed:
+            print(f"  {filename_for(card)}: {e}")
 
-    if current_aspect > target_aspect:
-        # too wide, adjust width
-        card_width = card_height * target_aspect
+        with open(failed_list_path, "w") as f:
+            f.write(",".join(names) + "\n")
+
+        print(
+            f"retry them with: UNO_ONLY_CARDS=$(cat {failed_list_path}) python3 main.py"
+        )
+        raise CardGenerationError(failed)
+
+    if os.path.exists(failed_list_path):
+        os.remove(failed_list_path)
+
+    if generate_first_only:
+        print("stopping after first card (generate_first_only=true)")
+
+    if not write_pngs:
+        return []
+
+    # cards outside the selection keep the files from previous runs
+    paths = [manifest.card_path(card) for card in deck]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def generate_all_cards(
+    pdf: Optional["PdfDeckWriter"] = None, output_dir: Optional[str] = None
+) -> List[str]:
+    output_dir = output_dir or OUTPUT_DIR
+    ensure_dir(output_dir)
+    manifest = Manifest(output_dir)
+    deck, selected = select_cards(manifest)
+    failed: List[Tuple[Card, Exception]] = []
+
+    # load test background once if in test mode
+    test_bg = load_test_background() if test_mode else None
+
+    cards = iter_card_art(selected, test_bg, failed)
+    deduper = RenderDeduper(output_dir, selected if pdf is not None else None)
+    circuit_breaker.begin_run()
+
+    try:
+        if pipeline_queue_size > 0 or render_processes > 0:
+            run_pipeline(cards, manifest, deduper, pdf)
+        else:
+            for card, prompt, art in cards:
+                save_card(card, art, prompt, manifest, deduper, pdf)
+    finally:
+        circuit_breaker.end_run()
+
+    return finish_generation(deck, failed, manifest)
+
+
+async def generate_all_cards_async(
+    aclient: Optional["AsyncOpenAI"] = None,
+    pdf: Optional["PdfDeckWriter"] = None,
+    output_dir: Optional[str] = None,
+) -> List[str]:
+    """builds one deck into output_dir, concurrent decks need their own dir
+
+    the other settings come from the environment and are shared by every deck
+    in the process, as are the rate limiter and the circuit breaker (a run only
+    starts it closed when no other deck is running)
+    """
+    # own the client for this run when the caller does not provide one
+    if aclient is None and not test_mode:
+        async with AsyncOpenAI(api_key=openai_api_key, max_retries=0) as aclient:
+            return await generate_all_cards_async(aclient, pdf, output_dir)
+
+    output_dir = output_dir or OUTPUT_DIR
+    ensure_dir(output_dir)
+    manifest = Manifest(output_dir)
+    deck, selected = select_cards(manifest)
+    failed: List[Tuple[Card, Exception]] = []
+
+    # load test background once if in test mode
+    test_bg = load_test_background() if test_mode else None
+
+    # prompts are built upfront so they do not depend on completion order
+    if test_mode:
+        jobs = [ArtJob(prompt="", cards=list(range(len(selected))))]
     else:
-        # too tall, adjust height
-        card_height = card_width / target_aspect
-
-    # recalculate spacing to center the cards
-    total_width = cards_per_row * card_width
-    total_height = cards_per_column * card_height
-    spacing_horizontal = (pw - total_width) / (cards_per_row + 1)
-    spacing_vertical = (ph - total_height) / (cards_per_column + 1)
-
-    for i, p in enumerate(image_paths):
-        with Image.open(p) as im:
-            # calculate position on current page
-            card_index_in_page = i % cards_per_page
-            row = card_index_in_page // cards_per_row
-            col = card_index_in_page % cards_per_row
-
-            # calculate coordinates with equal spacing
-            x = (col + 1) * spacing_horizontal + col * card_width
-            y = ph - ((row + 1) * spacing_vertical + (row + 1) * card_height)
+        jobs, _ = plan_art_jobs([prompt_for_card(card) for card in selected])
+        print(f"planned {len(jobs)} art generations for {len(selected)} cards")
+
+    semaphore = asyncio.Semaphore(art_workers)
+
+    async def fetch(job: ArtJob) -> Tuple[ArtJob, Image.Image]:
+        if test_mode:
+            return job, test_bg
 
+        try:
+            return job, await load_card_art_async(
+                aclient, job.prompt, openai_size, semaphore, job.variant
+            )
+        except Exception as e:
+            return job, e
+
+    tasks = [asyncio.create_task(fetch(job)) for job in jobs]
+    deduper = RenderDeduper(output_dir, selected if pdf is not None else None)
+    done = 0
+
+    async def arrivals():
+        if pdf is None:
+            # render the cards of each job as soon as its art arrives
+            for next_art in asyncio.as_completed(tasks):
+                job, art = await next_art
+                yield job, art, job.cards
+        else:
+            # the pdf takes the cards in deck order
+            task_of = {i: task for task, job in zip(tasks, jobs) for i in job.cards}
+
+            for i in range(len(selected)):
+                job, art = await task_of[i]
+                yield job, art, [i]
+
+    circuit_breaker.begin_run()
+
+    try:
+        async for job, art, indices in arrivals():
+            for i in indices:
+                done += 1
+                card = selected[i]
+                print(
+                    f"[{done:03d}/108] {card_label(card)} -> {job.prompt or 'using test background'}"
+                )
+
+                if isinstance(art, Exception):
+                    failed.append((card, art))
+                else:
+                    await asyncio.to_thread(
+                        save_card, card, art, job.prompt, manifest, deduper, pdf
+                    )
+    finally:
+        for task in tasks:
+            task.cancel()
+
+        circuit_breaker.end_run()
+
+    return finish_generation(deck, failed, manifest)
+
+
+class PdfDeckWriter:
+    """lays out cards 3x3 per a4 page as they are added"""
+
+    def __init__(self, pdf_path: str):
+        self.count = 0
+        self.images = {}
+        pw, ph = A4
+
+        # layout: exactly 3x3 cards per page
+        self.cards_per_row = 3
+        cards_per_column = 3
+        self.cards_per_page = self.cards_per_row * cards_per_column
+
+        # minimal margins
+        margin = pw * 0.02  # 2 percent margin
+        spacing = pw * 0.015  # 1.5 percent spacing between cards
+
+        # calculate card dimensions to fit exactly 3x3
+        available_width = pw - (2 * margin) - (2 * spacing)
+        available_height = ph - (2 * margin) - (2 * spacing)
+
+        card_width = available_width / self.cards_per_row
+        card_height = available_height / cards_per_column
+
+        # ensure aspect ratio is maintained
+        target_aspect = 825 / 1275
+        current_aspect = card_width / card_height
+
+        if current_aspect > target_aspect:
+            # too wide, adjust width
+            card_width = card_height * target_aspect
+        else:
+            # too tall, adjust height
+            card_height = card_width / target_aspect
+
+        # recalculate spacing to center the cards
+        total_width = self.cards_per_row * card_width
+        total_height = cards_per_column * card_height
+        self.spacing_horizontal = (pw - total_width) / (self.cards_per_row + 1)
+        self.spacing_vertical = (ph - total_height) / (cards_per_column + 1)
+        self.card_width, self.card_height = card_width, card_height
+        self.page_height = ph
+
+        self.open(pdf_path)
+
+    def open(self, pdf_path: str):
+        self.c = canvas.Canvas(pdf_path, pagesize=A4)
+
+    def add(self, card: Union[str, bytes, Image.Image]):
+        """adds a card from a png file, encoded png bytes or a rendered image"""
+        if isinstance(card, Image.Image):
+            key = image_digest(card)
+        else:
+            if isinstance(card, str):
+                with open(card, "rb") as f:
+                    card = f.read()
+
+            key = hashlib.sha256(card).hexdigest()
+
+        x, y = self.next_position()
+
+        # identical cards are embedded once and placed again by reference
+        if key in self.images:
+            self.place(self.images[key], x, y)
+        else:
+            self.images[key] = self.embed(card, x, y)
+
+        self.count += 1
+
+    def next_position(self) -> Tuple[float, float]:
+        # start new page when page is full
+        if self.count and self.count % self.cards_per_page == 0:
+            self.new_page()
+
+        # calculate position on current page
+        card_index_in_page = self.count % self.cards_per_page
+        row = card_index_in_page // self.cards_per_row
+        col = card_index_in_page % self.cards_per_row
+
+        # calculate coordinates with equal spacing
+        x = (col + 1) * self.spacing_horizontal + col * self.card_width
+        y = self.page_height - (
+            (row + 1) * self.spacing_vertical + (row + 1) * self.card_height
+        )
+
+        return x, y
+
+    @staticmethod
+    def open_card(card: Union[bytes, Image.Image]):
+        return (
+            Image.open(io.BytesIO(card))
+            if isinstance(card, bytes)
+            else nullcontext(card)
+        )
+
+    def new_page(self):
+        self.c.showPage()
+
+    def place(self, placed: Tuple[str, float, float, float, float], x: float, y: float):
+        name, dx, dy, width, height = placed
+        self.c.saveState()
+        self.c.translate(x + dx, y + dy)
+        self.c.scale(width, height)
+        self.c.doForm(name)
+        self.c.restoreState()
+
+    def embed(
+        self, card: Union[bytes, Image.Image], x: float, y: float
+    ) -> Tuple[str, float, float, float, float]:
+        placed = {"name": None, "x": None, "y": None, "width": None, "height": None}
+
+        with self.open_card(card) as im:
             # the image is already upscaled, so we draw it at the calculated size
-            c.drawImage(
-                ImageReader(im),
+            self.c.drawImage(
+                ImageReader(self.fit_dpi(im)),
                 x,
                 y,
-                width=card_width,
-                height=card_height,
+                width=self.card_width,
+                height=self.card_height,
                 preserveAspectRatio=True,
                 mask="auto",
+                extraReturn=placed,
+            )
+
+        return (
+            placed["name"],
+            placed["x"] - x,
+            placed["y"] - y,
+            placed["width"],
+            placed["height"],
+        )
+
+    def dpi_size(self) -> Optional[Tuple[int, int]]:
+        """pixels a card placement needs at pdf_dpi"""
+        if pdf_dpi == 0:
+            return None
+
+        # placement size in points, 72 per inch
+        return (
+            round(self.card_width * pdf_dpi / 72),
+            round(self.card_height * pdf_dpi / 72),
+        )
+
+    def fit_dpi(self, im: Image.Image) -> Image.Image:
+        return downsample_card(im, self.dpi_size())
+
+    def close(self):
+        self.c.save()
+
+    def abort(self):
+        # the canvas only writes on save
+        pass
+
+
+class StreamingPdfWriter(PdfDeckWriter):
+    """writes each page and its new images to disk as soon as they are done"""
+
+    def open(self, pdf_path: str):
+        self.path = pdf_path
+        self.tmp_path = temp_path_for(pdf_path)
+        self.f = open(self.tmp_path, "wb")
+        self.f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+        # the catalog and page tree are objects 1 and 2, written last
+        self.offsets = {}
+        self.next_id = 3
+        self.page_ids = []
+        self.xobjects = {}
+
+        # content and image names of the page being filled
+        self.content = []
+        self.page_xobjects = {}
+
+        # cards waiting on worker processes, embedded in the order they were added
+        self.executor = None
+        self.processes = 0
+        self.pending = deque()
+        self.submitted = set()
+
+    def new_id(self) -> int:
+        self.next_id += 1
+        return self.next_id - 1
+
+    def write_object(self, obj_id: int, entries: str, stream: Optional[bytes] = None):
+        self.offsets[obj_id] = self.f.tell()
+
+        if stream is None:
+            self.f.write(f"{obj_id} 0 obj\n<< {entries} >>\nendobj\n".encode())
+        else:
+            header = f"{obj_id} 0 obj\n<< {entries} /Length {len(stream)} >>\n"
+            self.f.write(header.encode() + b"stream\n")
+            self.f.write(stream)
+            self.f.write(b"\nendstream\nendobj\n")
+
+    def embed(
+        self, card: Union[bytes, Image.Image], x: float, y: float
+    ) -> Tuple[str, float, float, float, float]:
+        image = None
+
+        if isinstance(card, bytes):
+            image = passthrough_image(card, self.dpi_size())
+
+        if image is None:
+            with self.open_card(card) as im:
+                image = encode_pdf_image(self.fit_dpi(im))
+
+        return self.embed_encoded(image, x, y)
+
+    def embed_encoded(
+        self, image: "PdfImage", x: float, y: float
+    ) -> Tuple[str, float, float, float, float]:
+        entries = (
+            f"/Type /XObject /Subtype /Image /Width {image.width}"
+            f" /Height {image.height} /BitsPerComponent 8"
+        )
+        image_id = self.new_id()
+
+        # transparency goes in a soft mask, as drawImage does with mask="auto"
+        if image.alpha is not None:
+            mask_id = self.new_id()
+            self.write_object(
+                mask_id,
+                entries + " /Filter /FlateDecode /ColorSpace /DeviceGray",
+                image.alpha,
             )
+            entries += f" /SMask {mask_id} 0 R"
+
+        entries += f" /Filter {image.filter}"
 
-            # start new page when page is full
-            if (i + 1) % cards_per_page == 0 and i + 1 < len(image_paths):
-                c.showPage()
+        if image.decode_parms:
+            entries += f" {image.decode_parms}"
 
-    c.save()
+        entries += f" /ColorSpace {image.colorspace}"
+        self.write_object(image_id, entries, image.data)
+        width, height = image.width, image.height
+
+        # fit the card box keeping the aspect ratio, centered
+        scale = min(self.card_width / width, self.card_height / height)
+        width, height = width * scale, height * scale
+        name = f"Im{image_id}"
+        self.xobjects[name] = image_id
+
+        placed = (
+            name,
+            (self.card_width - width) / 2,
+            (self.card_height - height) / 2,
+            width,
+            height,
+        )
+        self.place(placed, x, y)
+
+        return placed
+
+    def use_processes(self, processes: int):
+        """encodes the distinct cards added from now on in worker processes"""
+        if processes > 0 and self.executor is None:
+            self.processes = processes
+            self.executor = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def add(self, card: Union[str, bytes, Image.Image]):
+        if self.executor is None:
+            super().add(card)
+            return
+
+        path = card if isinstance(card, str) else None
+        if path:
+            with open(path, "rb") as f:
+                card = f.read()
+
+        if isinstance(card, Image.Image):
+            key = image_digest(card)
+        else:
+            key = hashlib.sha256(card).hexdigest()
+
+        image = None
+
+        # passed through cards need no worker, the rest are encoded there
+        if key not in self.submitted:
+            self.submitted.add(key)
+            image = self.submit_encode(card, path)
+
+        self.pending.append((key, image))
+
+        # a window of cards ahead keeps the workers busy and memory bounded
+        while len(self.pending) > 4 * self.processes:
+            self.add_encoded(*self.pending.popleft())
+
+    def submit_encode(
+        self, card: Union[bytes, Image.Image], path: Optional[str]
+    ) -> Union["PdfImage", Future]:
+        size = self.dpi_size()
+
+        # rendered cards are downsampled first, less to send to the worker
+        if isinstance(card, Image.Image):
+            return self.executor.submit(encode_pdf_image, downsample_card(card, size))
+
+        image = passthrough_image(card, size)
+        if image is not None:
+            return image
+
+        # a worker reads a card file itself instead of receiving its bytes
+        if path:
+            return self.executor.submit(encode_pdf_file, path, size)
+
+        return self.executor.submit(encode_pdf_bytes, card, size)
+
+    def flush(self):
+        while self.pending:
+            self.add_encoded(*self.pending.popleft())
+
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def add_encoded(self, key: str, image: Union["PdfImage", Future, None]):
+        x, y = self.next_position()
+
+        if image is None:
+            self.place(self.images[key], x, y)
+        else:
+            if isinstance(image, Future):
+                image = image.result()
+
+            self.images[key] = self.embed_encoded(image, x, y)
+
+        self.count += 1
+
+    def place(self, placed: Tuple[str, float, float, float, float], x: float, y: float):
+        name, dx, dy, width, height = placed
+        self.page_xobjects[name] = self.xobjects[name]
+        self.content.append(
+            f"q {width:.4f} 0 0 {height:.4f} {x + dx:.4f} {y + dy:.4f} cm /{name} Do Q"
+        )
+
+    def new_page(self):
+        """writes the finished page, only its content was held in memory"""
+        content_id, page_id = self.new_id(), self.new_id()
+        content = zlib.compress("\n".join(self.content).encode())
+        self.write_object(content_id, "/Filter /FlateDecode", content)
+
+        pw, ph = A4
+        xobjects = " ".join(f"/{n} {i} 0 R" for n, i in self.page_xobjects.items())
+        self.write_object(
+            page_id,
+            f"/Type /Page /Parent 2 0 R /MediaBox [0 0 {pw:.4f} {ph:.4f}]"
+            f" /Contents {content_id} 0 R /Resources << /XObject << {xobjects} >> >>",
+        )
+
+        self.page_ids.append(page_id)
+        self.content = []
+        self.page_xobjects = {}
+
+    def close(self):
+        self.flush()
+
+        if self.content or not self.page_ids:
+            self.new_page()
+
+        kids = " ".join(f"{i} 0 R" for i in self.page_ids)
+        self.write_object(2, f"/Type /Pages /Kids [{kids}] /Count {len(self.page_ids)}")
+        self.write_object(1, "/Type /Catalog /Pages 2 0 R")
+
+        xref = self.f.tell()
+        self.f.write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n".encode())
+
+        for obj_id in range(1, self.next_id):
+            self.f.write(f"{self.offsets[obj_id]:010d} 00000 n \n".encode())
+
+        self.f.write(
+            f"trailer\n<< /Size {self.next_id} /Root 1 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n".encode()
+        )
+        self.f.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+        self.f.close()
+        os.remove(self.tmp_path)
+
+
+@dataclass
+class PdfImage:
+    """card pixels compressed for a pdf image object"""
+
+    width: int
+    height: int
+    data: bytes
+    alpha: Optional[bytes] = None
+    colorspace: str = "/DeviceRGB"
+
+    # passed through streams keep the filter they were encoded with
+    filter: str = "/FlateDecode"
+    decode_parms: str = ""
+
+
+def downsample_card(im: Image.Image, size: Optional[Tuple[int, int]]) -> Image.Image:
+    if size is None or size[0] >= im.width:
+        return im
+
+    return im.resize(size, Image.LANCZOS)
+
+
+def encode_pdf_image(im: Image.Image) -> PdfImage:
+    alpha = None
+
+    if "A" in im.getbands():
+        alpha = zlib.compress(im.getchannel("A").tobytes())
+
+    rgb = zlib.compress(im.convert("RGB").tobytes())
+
+    return PdfImage(im.width, im.height, rgb, alpha)
+
+
+def encode_pdf_file(path: str, size: Optional[Tuple[int, int]]) -> PdfImage:
+    with Image.open(path) as im:
+        return encode_pdf_image(downsample_card(im, size))
+
+
+def encode_pdf_bytes(data: bytes, size: Optional[Tuple[int, int]]) -> PdfImage:
+    with Image.open(io.BytesIO(data)) as im:
+        return encode_pdf_image(downsample_card(im, size))
+
+
+def passthrough_image(
+    data: bytes, size: Optional[Tuple[int, int]]
+) -> Optional[PdfImage]:
+    """the card file as a pdf image without decoding, when the pdf can read it"""
+    if not pdf_passthrough:
+        return None
+
+    if data.startswith(b"\xff\xd8"):
+        with Image.open(io.BytesIO(data)) as im:
+            if im.mode not in ("RGB", "L") or (size is not None and size[0] < im.width):
+                return None
+
+            colorspace = "/DeviceRGB" if im.mode == "RGB" else "/DeviceGray"
+            return PdfImage(im.width, im.height, data, None, colorspace, "/DCTDecode")
+
+    if not data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return None
+
+    # png image data is a zlib stream the pdf png predictors decode as is
+    pos = 8
+    idat = []
+
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos : pos + 8])
+        chunk = data[pos + 8 : pos + 8 + length]
+        pos += 12 + length
+
+        if kind == b"IHDR":
+            width, height, depth, color_type, _, _, interlace = struct.unpack(
+                ">IIBBBBB", chunk
+            )
+
+            # 8 bit rgb or gray without interlacing, alpha has no pdf equivalent
+            if depth != 8 or color_type not in (0, 2) or interlace:
+                return None
+
+            if size is not None and size[0] < width:
+                return None
+        elif kind == b"tRNS":
+            return None
+        elif kind == b"IDAT":
+            idat.append(chunk)
+        elif kind == b"IEND":
+            break
+
+    colors = 3 if color_type == 2 else 1
+    return PdfImage(
+        width,
+        height,
+        b"".join(idat),
+        colorspace="/DeviceRGB" if colors == 3 else "/DeviceGray",
+        decode_parms=(
+            f"/DecodeParms << /Predictor 15 /Colors {colors}"
+            f" /BitsPerComponent 8 /Columns {width} >>"
+        ),
+    )
+
+
+def open_pdf(pdf_path: str) -> PdfDeckWriter:
+    # parallel assembly writes through the streaming writer
+    if pdf_streaming or pdf_processes > 0:
+        pdf = StreamingPdfWriter(pdf_path)
+        pdf.use_processes(pdf_processes)
+        return pdf
+
+    return PdfDeckWriter(pdf_path)
+
+
+def images_to_pdf(image_paths: List[str], pdf_path: str):
+    pdf = open_pdf(pdf_path)
+
+    try:
+        for p in image_paths:
+            pdf.add(p)
+    except BaseException:
+        pdf.abort()
+        raise
+
+    pdf.close()
+
+
+def benchmark_png():
+    """encodes one rendered test card with every compression setting"""
+    card = build_uno_deck()[0]
+    card_img = render_card(card, load_test_background())
+    print(f"{filename_for(card)} at {card_img.width}x{card_img.height}")
+    print("level  alpha   size (MB)  time (s)")
+
+    for alpha in (True, False):
+        for level in range(10):
+            buf = io.BytesIO()
+            start = time.perf_counter()
+            img = card_img if alpha else flatten_alpha(card_img)
+            img.save(buf, "PNG", compress_level=level)
+            elapsed = time.perf_counter() - start
+            size = buf.tell() / 1024 / 1024
+            print(
+                f"{level:>5}  {str(alpha).lower():>5}  {size:>10.2f}  {elapsed:>8.2f}"
+            )
 
 
 def main():
-    paths = generate_all_cards()
-    print(f"Generated {len(paths)} card images at: {OUTPUT_DIR}")
-    print(f"Building PDF: {PDF_PATH}")
-    images_to_pdf(paths, PDF_PATH)
+    if png_benchmark:
+        benchmark_png()
+        return
+
+    # without png files the cards are drawn into the pdf as they are rendered
+    pdf = None
+
+    if not write_pngs:
+        ensure_dir(OUTPUT_DIR)
+        pdf = open_pdf(PDF_PATH)
+
+    try:
+        if use_async:
+            paths = asyncio.run(generate_all_cards_async(pdf=pdf))
+        else:
+            paths = generate_all_cards(pdf)
+    except BaseException as e:
+        # no partial pdf is left behind
+        if pdf is not None:
+            pdf.abort()
+
+        if isinstance(e, CardGenerationError):
+            raise SystemExit(f"{e}, PDF not built")
+
+        raise
+
+    if pdf is None:
+        print(f"Generated {len(paths)} card images at: {OUTPUT_DIR}")
+        print(f"Building PDF: {PDF_PATH}")
+        images_to_pdf(paths, PDF_PATH)
+    else:
+        # cards still with the pdf workers are counted once the pdf is closed
+        pdf.close()
+        print(f"Rendered {pdf.count} cards into PDF: {PDF_PATH}")
+
+    peak_rss = peak_rss_mb()
+    if peak_rss is not None:
+        print(f"Peak memory: {peak_rss:.0f} MB (main process)")
+
+    # render and pdf workers have exited by now, so they are counted
+    peak_worker_rss = peak_rss_mb(children=True)
+    if peak_worker_rss:
+        print(f"Peak memory: {peak_worker_rss:.0f} MB (largest worker process)")
     print("Done!")
 
 